@@ -37,3 +37,65 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 """A module for expanding the the local CAZY database beyond what is provided within CAZy."""
+
+
+import re
+
+from sqlalchemy import and_, func
+
+from scraper.sql.sql_orm import CazyFamily
+
+
+# matches the class abbreviation in parentheses, e.g. "Glycoside Hydrolases (GHs)" -> "GH";
+# the standardised class names (cazy_dictionary.json) pluralise the abbreviation, and the
+# trailing 's' must be dropped to match the family names (GH1, PL28, ...)
+CLASS_ABBREV_RE = re.compile(r"\(([A-Z]+)s\)")
+
+
+def build_class_fam_filters(config_dict):
+    """Combine the CAZy classes and (sub)families from the config into one list of filters.
+
+    Collecting every criterion into a single list lets the caller query the database
+    once with or_(), instead of performing a separate query per CAZy class and family,
+    and keeps the expand modules selecting specific records on one shared code path.
+
+    :param config_dict: dict, defines CAZy classes and families to retrieve records for
+
+    Return list of SQLAlchemy filter criteria.
+    """
+    config_filters = []
+
+    for cazy_class in config_dict["classes"]:
+        # retrieve class name abbreviation, e.g. "Glycoside Hydrolases (GHs)" -> "GH"
+        match = CLASS_ABBREV_RE.search(cazy_class)
+        cazy_class = match.group(1) if match else cazy_class
+        # LIKE with a plain prefix can use the index on the family column, unlike REGEXP
+        # which calls back into Python for every row; the substr check retains the
+        # requirement for a digit immediately after the class abbreviation
+        config_filters.append(
+            and_(
+                CazyFamily.family.like(f"{cazy_class}%"),
+                func.substr(CazyFamily.family, len(cazy_class) + 1, 1).in_(list("0123456789")),
+            )
+        )
+
+    families = []
+    subfamilies = []
+    for key in config_dict:
+        if key == "classes":
+            continue
+        if config_dict[key] is None:
+            continue  # no families to parse
+
+        for family in config_dict[key]:
+            if "_" in family:  # subfamily
+                subfamilies.append(family)
+            else:  # family
+                families.append(family)
+
+    if len(families) != 0:
+        config_filters.append(CazyFamily.family.in_(families))
+    if len(subfamilies) != 0:
+        config_filters.append(CazyFamily.subfamily.in_(subfamilies))
+
+    return config_filters
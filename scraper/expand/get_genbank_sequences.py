@@ -41,18 +41,24 @@
 
 import logging
 import os
+import random
 import re
+import shutil
 import sys
 import time
 
-import pandas as pd
-
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from itertools import islice
+from tempfile import SpooledTemporaryFile
 from typing import List, Optional
+from urllib.error import HTTPError
 
-from Bio import Entrez, SeqIO
-from tqdm import tqdm
+from Bio import Entrez
+from Bio.SeqIO.FastaIO import SimpleFastaParser
+from sqlalchemy import or_
 
+from scraper.expand import build_class_fam_filters
 from scraper.sql.sql_orm import (
     Cazyme,
     CazyFamily,
@@ -66,11 +72,24 @@ from scraper.utilities import config_logger, file_io, parse_configuration
 from scraper.utilities.parsers import build_genbank_sequences_parser
 
 
+# patterns matching the accepted protein accession formats, compiled once at import
+# because they are tested against every item of every record id returned by NCBI.
+# The patterns are anchored, and ordered by how frequently each format occurs, so the
+# common case (a standard GenBank protein accession) matches on the first attempt
+GENBANK_ACCESSION_RES = (
+    re.compile(r"\D{3}\d{5,7}\.\d+$"),  # standard GenBank protein, e.g. "AAB27634.1"
+    re.compile(r"\D\d(\D|\d){3}\d$"),  # UniProt/PIR style, e.g. "P12345"
+    re.compile(r"\D\d(\D|\d){3}\d\D(\D|\d){2}\d$"),  # extended UniProt, e.g. "A0A16BC24"
+)
+
+# look the logger up once at import, rather than on every function invocation
+logger = logging.getLogger(__name__)
+
+
 def main(argv: Optional[List[str]] = None, logger: Optional[logging.Logger] = None):
     """Set up programme and initate run."""
-    start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # used in terminating message
-    start_time = pd.to_datetime(start_time)
-    date_today = datetime.now().strftime("%Y/%m/%d")  # used as seq_update_date in the db
+    start_time = datetime.now()  # used in terminating message
+    date_today = start_time.strftime("%Y/%m/%d")  # used as seq_update_date in the db
 
     # parse cmd-line arguments
     if argv is None:
@@ -91,6 +110,13 @@ def main(argv: Optional[List[str]] = None, logger: Optional[logging.Logger] = No
         sys.exit(1)
 
     Entrez.email = args.email
+    # let Biopython retry transient HTTP failures, and keep its retry cadence in line
+    # with entrez_retry
+    Entrez.max_tries = 3
+    Entrez.sleep_between_tries = 10
+    if args.api_key is not None:
+        # an API key raises the NCBI request limit from 3 to 10 requests per second
+        Entrez.api_key = args.api_key
 
     # create session to local database
     session = get_db_session(args)
@@ -140,17 +166,14 @@ def main(argv: Optional[List[str]] = None, logger: Optional[logging.Logger] = No
     if args.blastdb is not None:
         file_io.build_blast_db(args)
 
-    end_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # used in terminating message
-    end_time = pd.to_datetime(start_time)
-    end_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    end_time = pd.to_datetime(end_time)
+    end_time = datetime.now()  # used in terminating message
     total_time = end_time - start_time
 
     logger.info(
         "Finished populating local CAZy database with GenBank protein sequences. "
         "Terminating program.\n"
-        f"Scrape initated at {start_time}\n"
-        f"Scrape finished at {end_time}\n"
+        f"Scrape initated at {start_time:%Y-%m-%d %H:%M:%S}\n"
+        f"Scrape finished at {end_time:%Y-%m-%d %H:%M:%S}\n"
         f"Total run time: {total_time}"
     )
 
@@ -158,8 +181,8 @@ def main(argv: Optional[List[str]] = None, logger: Optional[logging.Logger] = No
         "=====================cazy_webscraper-expand-genank_sequences=====================\n"
         "Finished populating local CAZy database with GenBank protein sequences. "
         "Terminating program.\n"
-        f"Scrape initated at {start_time}\n"
-        f"Scrape finished at {end_time}\n"
+        f"Scrape initated at {start_time:%Y-%m-%d %H:%M:%S}\n"
+        f"Scrape finished at {end_time:%Y-%m-%d %H:%M:%S}\n"
         f"Total run time: {total_time}\n"
     )
 
@@ -167,6 +190,31 @@ def main(argv: Optional[List[str]] = None, logger: Optional[logging.Logger] = No
 # The folowing functions are for querying the local database to get GenBank accessions
 
 
+def base_genbank_query(session):
+    """Build the base join of GenBank accessions to their CAZymes, taxonomies and kingdoms.
+
+    Every accession retrieval in this module filters the same 5-way join; building it in
+    one place keeps the query shape identical across functions. Only the columns the
+    extraction functions read are selected, so each row is a lightweight tuple rather
+    than five hydrated ORM instances.
+
+    :param session: open SQLite db session
+
+    Return a SQLAlchemy Query object.
+    """
+    return session.query(
+        Genbank.genbank_accession,
+        Genbank.seq_update_date,
+        Taxonomy.genus,
+        Taxonomy.species,
+    ).\
+        select_from(Kingdom).\
+        join(Taxonomy, (Taxonomy.kingdom_id == Kingdom.kingdom_id)).\
+        join(Cazyme, (Cazyme.taxonomy_id == Taxonomy.taxonomy_id)).\
+        join(Cazymes_Genbanks, (Cazymes_Genbanks.cazyme_id == Cazyme.cazyme_id)).\
+        join(Genbank, (Genbank.genbank_id == Cazymes_Genbanks.genbank_id))
+
+
 def get_missing_sequences_for_everything(date_today, taxonomy_filters, kingdoms, session, args):
     """Retrieve protein sequences for all CAZymes in the local CAZy database that don't have seq.
 
@@ -178,34 +226,24 @@ def get_missing_sequences_for_everything(date_today, taxonomy_filters, kingdoms,
 
     Return nothing.
     """
-    logger = logging.getLogger(__name__)
-
     # retrieve only sequences for primary GenBank accessions, and those without sequences
     if args.primary is True:
         logger.warning(
             "Retrieving sequences for all primary GenBank accessions that do not have sequences"
         )
-        genbank_query = session.query(Genbank, Cazymes_Genbanks, Cazyme, Taxonomy, Kingdom).\
-            join(Taxonomy, (Taxonomy.kingdom_id == Kingdom.kingdom_id)).\
-            join(Cazyme, (Cazyme.taxonomy_id == Taxonomy.taxonomy_id)).\
-            join(Cazymes_Genbanks, (Cazymes_Genbanks.cazyme_id == Cazyme.cazyme_id)).\
-            join(Genbank, (Genbank.genbank_id == Cazymes_Genbanks.genbank_id)).\
+        genbank_query = base_genbank_query(session).\
             filter(Cazymes_Genbanks.primary == True).\
             filter(Genbank.sequence == None).\
-            all()
+            yield_per(1000)
 
     # retrieve sequences for all GenBank accessions without sequences
     else:
         logger.warning(
             "Retrieving sequences for all GenBank accessions that do not have sequences"
         )
-        genbank_query = session.query(Genbank, Cazymes_Genbanks, Cazyme, Taxonomy, Kingdom).\
-            join(Taxonomy, (Taxonomy.kingdom_id == Kingdom.kingdom_id)).\
-            join(Cazyme, (Cazyme.taxonomy_id == Taxonomy.taxonomy_id)).\
-            join(Cazymes_Genbanks, (Cazymes_Genbanks.cazyme_id == Cazyme.cazyme_id)).\
-            join(Genbank, (Genbank.genbank_id == Cazymes_Genbanks.genbank_id)).\
+        genbank_query = base_genbank_query(session).\
             filter(Genbank.sequence == None).\
-            all()
+            yield_per(1000)
 
     # retrieve the genbank_accessions
     accessions = extract_accessions(genbank_query, taxonomy_filters)
@@ -219,8 +257,7 @@ def get_missing_sequences_for_everything(date_today, taxonomy_filters, kingdoms,
 
     # separate accesions in to separate lists of length args.epost, epost doesn't like more than 200
     accessions = get_accession_chunks(accessions, args.epost)  # args.epost = number per chunk
-    for lst in accessions:
-        get_sequences_add_to_db(lst, date_today, session, args)
+    get_sequences_for_accession_chunks(accessions, date_today, session, args)
     return
 
 
@@ -239,22 +276,25 @@ def add_and_update_all_sequences(date_today, taxonomy_filters, kingdoms, session
 
     Return nothing.
     """
-    logger = logging.getLogger(__name__)
-
     # retrieve only sequences for primary GenBank accessions, and those without sequences
+    # let the database split the records with and without sequences, so records without
+    # sequences are not needlessly checked against NCBI for sequence updates
     if args.primary is True:
         logger.warning(
             "Retrieving sequences for all primary GenBank accessions that do not have sequences\n"
             "and those whose sequences have been updated in NCBI "
             "since they were retrieved previously"
         )
-        genbank_query = session.query(Genbank, Cazymes_Genbanks, Cazyme, Taxonomy, Kingdom).\
-            join(Taxonomy, (Taxonomy.kingdom_id == Kingdom.kingdom_id)).\
-            join(Cazyme, (Cazyme.taxonomy_id == Taxonomy.taxonomy_id)).\
-            join(Cazymes_Genbanks, (Cazymes_Genbanks.cazyme_id == Cazyme.cazyme_id)).\
-            join(Genbank, (Genbank.genbank_id == Cazymes_Genbanks.genbank_id)).\
+        genbank_query_no_seq = base_genbank_query(session).\
+            filter(Cazymes_Genbanks.primary == True).\
+            filter(Genbank.sequence == None).\
+            yield_per(1000)
+
+        genbank_query_with_seq = base_genbank_query(session).\
             filter(Cazymes_Genbanks.primary == True).\
-            all()
+            filter(Genbank.sequence != None).\
+            order_by(Genbank.seq_update_date.asc()).\
+            yield_per(1000)
 
     # retrieve sequences for all GenBank accessions
     else:
@@ -263,36 +303,36 @@ def add_and_update_all_sequences(date_today, taxonomy_filters, kingdoms, session
             "and those whose sequences have been updated in NCBI "
             "since they were retrieved previously"
         )
-        genbank_query = session.query(Genbank, Cazymes_Genbanks, Cazyme, Taxonomy, Kingdom).\
-            join(Taxonomy, (Taxonomy.kingdom_id == Kingdom.kingdom_id)).\
-            join(Cazyme, (Cazyme.taxonomy_id == Taxonomy.taxonomy_id)).\
-            join(Cazymes_Genbanks, (Cazymes_Genbanks.cazyme_id == Cazyme.cazyme_id)).\
-            join(Genbank, (Genbank.genbank_id == Cazymes_Genbanks.genbank_id)).\
-            all()
+        genbank_query_no_seq = base_genbank_query(session).\
+            filter(Genbank.sequence == None).\
+            yield_per(1000)
 
-    # create dictionary of {genbank_accession: 'sequence update date' (str)}
-    accessions = extract_accessions_and_dates(genbank_query, taxonomy_filters)
+        genbank_query_with_seq = base_genbank_query(session).\
+            filter(Genbank.sequence != None).\
+            order_by(Genbank.seq_update_date.asc()).\
+            yield_per(1000)
 
-    if len(accessions.keys()) == 0:
-        logger.warning(
-            "Did not retrieve any GenBank accessions from the local database.\n"
-            "Not adding sequences to the local database."
-        )
-        return
+    # records without a sequence always need their sequence retrieving
+    accessions = extract_accessions(genbank_query_no_seq, taxonomy_filters)
 
-    accessions = get_accessions_for_new_sequences(accessions)  # list of genkbank_accession
+    # create dictionary of {genbank_accession: 'sequence update date' (str)}
+    # only records with a sequence need checking against NCBI for updated sequences
+    accessions_and_dates = extract_accessions_and_dates(genbank_query_with_seq, taxonomy_filters)
+
+    if len(accessions_and_dates.keys()) != 0:
+        # add accessions whose sequences need updating, list of genkbank_accession
+        accessions.extend(get_accessions_for_new_sequences(accessions_and_dates))
 
     if len(accessions) == 0:
         logger.warning(
-            "Did not retrieve any GenBank accessions whose sequences need updating.\n"
-            "Not adding sequences to the local database."
+            "Did not retrieve any GenBank accessions without a sequence or whose sequences\n"
+            "need updating. Not adding sequences to the local database."
         )
         return
 
     # separate accesions in to separate lists of length args.epost, epost doesn't like more than 200
     accessions = get_accession_chunks(accessions, args.epost)  # args.epost = number per chunk
-    for lst in accessions:
-        get_sequences_add_to_db(lst, date_today, session, args)
+    get_sequences_for_accession_chunks(accessions, date_today, session, args)
     return
 
 
@@ -315,121 +355,59 @@ def get_missing_sequences_for_specific_records(
 
     Return nothing.
     """
-    logger = logging.getLogger(__name__)
+    if not any(config_dict.values()):  # the config names no CAZy classes or families
+        logger.warning(
+            "No CAZy classes or families specified in the configuration.\n"
+            "Not adding sequences to the local database."
+        )
+        return
+
     logger.warning(
         "Retrieving sequences for GenBank accessions that do not have a sequence in the database"
     )
 
-    # start with the classes
-    if len(config_dict["classes"]) != 0:
-        # retrieve list of CAZy classes to get sequences for
-        cazy_classes = config_dict["classes"]
-
-        for cazy_class in tqdm(cazy_classes, desc="Parsing CAZy classes"):
-            # retrieve class name abbreviation
-            cazy_class = cazy_class[((cazy_class.find("(")) + 1):((cazy_class.find(")")) - 1)]
-
-            # get the CAZymes within the CAZy class
-            class_subquery = session.query(Cazyme.cazyme_id).\
-                join(CazyFamily, Cazyme.families).\
-                filter(CazyFamily.family.regexp(rf"{cazy_class}\d+")).\
-                subquery()
-
-            # retrieve the GenBank accessions of the CAZymes in the CAZy class without seqs
-            if args.primary:
-                genbank_query = session.query(Genbank, Cazymes_Genbanks, Cazyme, Taxonomy, Kingdom).\
-                    join(Taxonomy, (Taxonomy.kingdom_id == Kingdom.kingdom_id)).\
-                    join(Cazyme, (Cazyme.taxonomy_id == Taxonomy.taxonomy_id)).\
-                    join(Cazymes_Genbanks, (Cazymes_Genbanks.cazyme_id == Cazyme.cazyme_id)).\
-                    join(Genbank, (Genbank.genbank_id == Cazymes_Genbanks.genbank_id)).\
-                    filter(Cazyme.cazyme_id.in_(class_subquery)).\
-                    filter(Cazymes_Genbanks.primary == True).\
-                    filter(Genbank.sequence == None).\
-                    all()
-            else:
-                genbank_query = session.query(Genbank, Cazymes_Genbanks, Cazyme, Taxonomy, Kingdom).\
-                    join(Taxonomy, (Taxonomy.kingdom_id == Kingdom.kingdom_id)).\
-                    join(Cazyme, (Cazyme.taxonomy_id == Taxonomy.taxonomy_id)).\
-                    join(Cazymes_Genbanks, (Cazymes_Genbanks.cazyme_id == Cazyme.cazyme_id)).\
-                    join(Genbank, (Genbank.genbank_id == Cazymes_Genbanks.genbank_id)).\
-                    filter(Cazyme.cazyme_id.in_(class_subquery)).\
-                    filter(Genbank.sequence == None).\
-                    all()
-
-            # retrieve the genbank_accessions from the sql collection object returned by the query
-            accessions = extract_accessions(genbank_query, taxonomy_filters)
-
-            if len(accessions) == 0:
-                logger.warning(
-                    f"Did not retrieve any GenBank accessions for the CAZy class {cazy_class}\n"
-                    "that have missing sequences. Not adding sequences to the local database."
-                )
-                continue
+    config_filters = build_class_fam_filters(config_dict)
 
-            # separate accesions in to separate lists of length args.epost
-            # epost doesn't like posting more than 200 at once
-            accessions = get_accession_chunks(accessions, args.epost)  # args.epost = number/chunk
-            for lst in accessions:
-                get_sequences_add_to_db(lst, date_today, session, args)
-            continue
+    if len(config_filters) == 0:
+        logger.warning(
+            "No CAZy classes or families specified in the configuration.\n"
+            "Not adding sequences to the local database."
+        )
+        return
 
-    # Retrieve protein sequences for specified families
-    for key in config_dict:
-        if key == "classes":
-            continue
-        if config_dict[key] is None:
-            continue  # no families to parse
-
-        for family in tqdm(config_dict[key], desc=f"Parsing families in {key}"):
-            if family.find("_") != -1:  # subfamily
-                # Retrieve GenBank accessions catalogued under the subfamily
-                family_subquery = session.query(Cazyme.cazyme_id).\
-                    join(CazyFamily, Cazyme.families).\
-                    filter(CazyFamily.subfamily == family).\
-                    subquery()
-
-            else:  # family
-                # Retrieve GenBank accessions catalogued under the family
-                family_subquery = session.query(Cazyme.cazyme_id).\
-                    join(CazyFamily, Cazyme.families).\
-                    filter(CazyFamily.family == family).\
-                    subquery()
-
-            # get the GenBank accessions of thes CAZymes, without sequences
-            if args.primary:
-                genbank_query = session.query(Genbank, Cazymes_Genbanks, Cazyme, Taxonomy, Kingdom).\
-                    join(Taxonomy, (Taxonomy.kingdom_id == Kingdom.kingdom_id)).\
-                    join(Cazyme, (Cazyme.taxonomy_id == Taxonomy.taxonomy_id)).\
-                    join(Cazymes_Genbanks, (Cazymes_Genbanks.cazyme_id == Cazyme.cazyme_id)).\
-                    join(Genbank, (Genbank.genbank_id == Cazymes_Genbanks.genbank_id)).\
-                    filter(Cazyme.cazyme_id.in_(family_subquery)).\
-                    filter(Cazymes_Genbanks.primary == True).\
-                    filter(Genbank.sequence == None).\
-                    all()
-            else:
-                genbank_query = session.query(Genbank, Cazymes_Genbanks, Cazyme, Taxonomy, Kingdom).\
-                    join(Taxonomy, (Taxonomy.kingdom_id == Kingdom.kingdom_id)).\
-                    join(Cazyme, (Cazyme.taxonomy_id == Taxonomy.taxonomy_id)).\
-                    join(Cazymes_Genbanks, (Cazymes_Genbanks.cazyme_id == Cazyme.cazyme_id)).\
-                    join(Genbank, (Genbank.genbank_id == Cazymes_Genbanks.genbank_id)).\
-                    filter(Cazyme.cazyme_id.in_(family_subquery)).\
-                    filter(Genbank.sequence == None).\
-                    all()
-
-            # retrieve a list of GenBank accessions from the sql collection returned from the query
-            accessions = extract_accessions(genbank_query, taxonomy_filters)
-
-            if len(accessions) == 0:
-                logger.warning(
-                    f"Did not retrieve any GenBank accessions for the CAZy class {family}\n"
-                    "that have missing sequences. Not adding sequences to the local database."
-                )
-                continue
-            # separate accesions in to separate lists of length args.epost
-            # epost doesn't like posting more than 200 at once
-            accessions = get_accession_chunks(accessions, args.epost)  # args.epost = acc/chunk
-            for lst in accessions:
-                get_sequences_add_to_db(lst, date_today, session, args)
+    # get the CAZymes within the specified CAZy classes and (sub)families
+    cazyme_subquery = session.query(Cazyme.cazyme_id).\
+        join(CazyFamily, Cazyme.families).\
+        filter(or_(*config_filters)).\
+        subquery()
+
+    # retrieve the GenBank accessions of the selected CAZymes, without sequences
+    if args.primary:
+        genbank_query = base_genbank_query(session).\
+            filter(Cazyme.cazyme_id.in_(cazyme_subquery)).\
+            filter(Cazymes_Genbanks.primary == True).\
+            filter(Genbank.sequence == None).\
+            yield_per(1000)
+    else:
+        genbank_query = base_genbank_query(session).\
+            filter(Cazyme.cazyme_id.in_(cazyme_subquery)).\
+            filter(Genbank.sequence == None).\
+            yield_per(1000)
+
+    # retrieve the genbank_accessions from the sql collection object returned by the query
+    accessions = extract_accessions(genbank_query, taxonomy_filters)
+
+    if len(accessions) == 0:
+        logger.warning(
+            "Did not retrieve any GenBank accessions for the specified CAZy classes/families\n"
+            "that have missing sequences. Not adding sequences to the local database."
+        )
+        return
+
+    # separate accesions in to separate lists of length args.epost
+    # epost doesn't like posting more than 200 at once
+    accessions = get_accession_chunks(accessions, args.epost)  # args.epost = number/chunk
+    get_sequences_for_accession_chunks(accessions, date_today, session, args)
 
     return
 
@@ -458,138 +436,67 @@ def update_sequences_for_specific_records(
 
     Return nothing.
     """
-    logger = logging.getLogger(__name__)
+    if not any(config_dict.values()):  # the config names no CAZy classes or families
+        logger.warning(
+            "No CAZy classes or families specified in the configuration.\n"
+            "Not adding sequences to the local database."
+        )
+        return
+
     logger.warning(
         "Retrieving sequences for GenBank accessions that do not have a sequence in the database,\n"
         "and those whose sequence in NCBI has been updated since they were previously retrieved."
     )
 
-    # start with the classes
-    if len(config_dict["classes"]) != 0:
-        # retrieve list of CAZy classes to get sequences for
-        cazy_classes = config_dict["classes"]
-
-        for cazy_class in tqdm(cazy_classes, desc="Parsing CAZy classes"):
-            # retrieve class name abbreviation
-            cazy_class = cazy_class[((cazy_class.find("(")) + 1):((cazy_class.find(")")) - 1)]
-
-            # get the CAZymes within the CAZy class
-            class_subquery = session.query(Cazyme.cazyme_id).\
-                join(CazyFamily, Cazyme.families).\
-                filter(CazyFamily.family.regexp(rf"{cazy_class}\d+")).\
-                subquery()
-
-            # retrieve the GenBank accessions of the CAZymes in the CAZy class without seqs
-            if args.primary:
-                genbank_query = session.query(Genbank, Cazymes_Genbanks, Cazyme, Taxonomy, Kingdom).\
-                    join(Taxonomy, (Taxonomy.kingdom_id == Kingdom.kingdom_id)).\
-                    join(Cazyme, (Cazyme.taxonomy_id == Taxonomy.taxonomy_id)).\
-                    join(Cazymes_Genbanks, (Cazymes_Genbanks.cazyme_id == Cazyme.cazyme_id)).\
-                    join(Genbank, (Genbank.genbank_id == Cazymes_Genbanks.genbank_id)).\
-                    filter(Cazyme.cazyme_id.in_(class_subquery)).\
-                    filter(Cazymes_Genbanks.primary == True).\
-                    all()
-            else:
-                genbank_query = session.query(Genbank, Cazymes_Genbanks, Cazyme, Taxonomy, Kingdom).\
-                    join(Taxonomy, (Taxonomy.kingdom_id == Kingdom.kingdom_id)).\
-                    join(Cazyme, (Cazyme.taxonomy_id == Taxonomy.taxonomy_id)).\
-                    join(Cazymes_Genbanks, (Cazymes_Genbanks.cazyme_id == Cazyme.cazyme_id)).\
-                    join(Genbank, (Genbank.genbank_id == Cazymes_Genbanks.genbank_id)).\
-                    filter(Cazyme.cazyme_id.in_(class_subquery)).\
-                    all()
-
-            # create dictionary of genbank_accession: 'sequence update date' (str)
-            accessions = extract_accessions_and_dates(genbank_query, taxonomy_filters)
-
-            if len(accessions.keys()) == 0:
-                logger.warning(
-                    f"Did not retrieve any GenBank accessions for the CAZy class {cazy_class}.\n"
-                    "Not adding sequences to the local database."
-                )
-                continue
+    config_filters = build_class_fam_filters(config_dict)
 
-            accessions = get_accessions_for_new_sequences(accessions)  # list of genkbank_accession
+    if len(config_filters) == 0:
+        logger.warning(
+            "No CAZy classes or families specified in the configuration.\n"
+            "Not adding sequences to the local database."
+        )
+        return
 
-            if len(accessions) == 0:
-                logger.warning(
-                    "Did not retrieve any GenBank accessions whose sequences need updating for "
-                    f"the CAZy class {cazy_class}.\n"
-                    "Not adding sequences to the local database."
-                )
-                continue
-            # separate accesions in to separate lists of length args.epost
-            # epost doesn't like posting more than 200 at once
-            accessions = get_accession_chunks(accessions, args.epost)  # args.epost = acc/chunk
-            for lst in accessions:
-                get_sequences_add_to_db(lst, date_today, session, args)
-
-    # Retrieve protein sequences for specified families
-    for key in config_dict:
-        if key == "classes":
-            continue
-        if config_dict[key] is None:
-            continue  # no families to parse
-
-        for family in tqdm(config_dict[key], desc=f"Parsing families in {key}"):
-            if family.find("_") != -1:  # subfamily
-                # Retrieve GenBank accessions catalogued under the subfamily
-                family_subquery = session.query(Cazyme.cazyme_id).\
-                    join(CazyFamily, Cazyme.families).\
-                    filter(CazyFamily.subfamily == family).\
-                    subquery()
-
-            else:  # family
-                # Retrieve GenBank accessions catalogued under the family
-                family_subquery = session.query(Cazyme.cazyme_id).\
-                    join(CazyFamily, Cazyme.families).\
-                    filter(CazyFamily.family == family).\
-                    subquery()
-
-            # get the GenBank accessions of thes CAZymes, without sequences
-            if args.primary:
-                genbank_query = session.query(Genbank, Cazymes_Genbanks, Cazyme, Taxonomy, Kingdom).\
-                    join(Taxonomy, (Taxonomy.kingdom_id == Kingdom.kingdom_id)).\
-                    join(Cazyme, (Cazyme.taxonomy_id == Taxonomy.taxonomy_id)).\
-                    join(Cazymes_Genbanks, (Cazymes_Genbanks.cazyme_id == Cazyme.cazyme_id)).\
-                    join(Genbank, (Genbank.genbank_id == Cazymes_Genbanks.genbank_id)).\
-                    filter(Cazyme.cazyme_id.in_(family_subquery)).\
-                    filter(Cazymes_Genbanks.primary == True).\
-                    filter(Genbank.sequence == None).\
-                    all()
-            else:
-                genbank_query = session.query(Genbank, Cazymes_Genbanks, Cazyme, Taxonomy, Kingdom).\
-                    join(Taxonomy, (Taxonomy.kingdom_id == Kingdom.kingdom_id)).\
-                    join(Cazyme, (Cazyme.taxonomy_id == Taxonomy.taxonomy_id)).\
-                    join(Cazymes_Genbanks, (Cazymes_Genbanks.cazyme_id == Cazyme.cazyme_id)).\
-                    join(Genbank, (Genbank.genbank_id == Cazymes_Genbanks.genbank_id)).\
-                    filter(Cazyme.cazyme_id.in_(family_subquery)).\
-                    filter(Genbank.sequence == None).\
-                    all()
-
-            # create dictionary of {genbank_accession: 'sequence update date' (str)}
-            accessions = extract_accessions_and_dates(genbank_query, taxonomy_filters)
-
-            if len(accessions.keys()) == 0:
-                logger.warning(
-                    f"Did not retrieve any GenBank accessions for the CAZy class {family}.\n"
-                    "Not adding sequences to the local database."
-                )
-                continue
+    # get the CAZymes within the specified CAZy classes and (sub)families
+    cazyme_subquery = session.query(Cazyme.cazyme_id).\
+        join(CazyFamily, Cazyme.families).\
+        filter(or_(*config_filters)).\
+        subquery()
 
-            accessions = get_accessions_for_new_sequences(accessions)  # list of genkbank_accession
+    # retrieve the GenBank accessions of the selected CAZymes
+    if args.primary:
+        genbank_query = base_genbank_query(session).\
+            filter(Cazyme.cazyme_id.in_(cazyme_subquery)).\
+            filter(Cazymes_Genbanks.primary == True).\
+            yield_per(1000)
+    else:
+        genbank_query = base_genbank_query(session).\
+            filter(Cazyme.cazyme_id.in_(cazyme_subquery)).\
+            yield_per(1000)
 
-            if len(accessions) == 0:
-                logger.warning(
-                    "Did not retrieve any GenBank accessions whose sequences need updating for "
-                    f"the CAZy class {family}.\n"
-                    "Not adding sequences to the local database."
-                )
-                continue
-            # separate accesions in to separate lists of length args.epost
-            # epost doesn't like posting more than 200 at once
-            accessions = get_accession_chunks(accessions, args.epost)  # args.epost = acc/chunk
-            for lst in accessions:
-                get_sequences_add_to_db(lst, date_today, session, args)
+    # create dictionary of {genbank_accession: 'sequence update date' (str)}
+    accessions = extract_accessions_and_dates(genbank_query, taxonomy_filters)
+
+    if len(accessions.keys()) == 0:
+        logger.warning(
+            "Did not retrieve any GenBank accessions for the specified CAZy classes/families.\n"
+            "Not adding sequences to the local database."
+        )
+        return
+
+    accessions = get_accessions_for_new_sequences(accessions)  # list of genkbank_accession
+
+    if len(accessions) == 0:
+        logger.warning(
+            "Did not retrieve any GenBank accessions whose sequences need updating for the\n"
+            "specified CAZy classes/families. Not adding sequences to the local database."
+        )
+        return
+
+    # separate accesions in to separate lists of length args.epost
+    # epost doesn't like posting more than 200 at once
+    accessions = get_accession_chunks(accessions, args.epost)  # args.epost = acc/chunk
+    get_sequences_for_accession_chunks(accessions, date_today, session, args)
 
     return
 
@@ -597,6 +504,19 @@ def update_sequences_for_specific_records(
 # The following functions are retrieving the list of Genbank accessions to retrieve sequences for #
 
 
+def compile_taxonomy_filter_re(taxonomy_filters):
+    """Compile the taxonomy filters into a single alternation pattern.
+
+    One compiled alternation scans each source organism once, however many filters the
+    user supplied, instead of one substring scan per filter per record.
+
+    :param taxonomy_filters: set of genera, species and strains to restrict retrieval
+
+    Return a compiled regular expression.
+    """
+    return re.compile("|".join(map(re.escape, taxonomy_filters)))
+
+
 def extract_accessions(genbank_query, taxonomy_filters):
     """The query contains GenBank accessions and Cazymes_Genbanks records, retrieve the accessions.
 
@@ -606,16 +526,19 @@ def extract_accessions(genbank_query, taxonomy_filters):
     Return a list of GenBank accessions. Each element is a string of a unique accession.
     """
     if taxonomy_filters is None:
-        accessions = [item[0] for item in genbank_query]
-        return [x for x in accessions if "NA" != x]
+        return [
+            item.genbank_accession for item in genbank_query
+            if item.genbank_accession != "NA"
+        ]
 
     else:
+        taxonomy_pattern = compile_taxonomy_filter_re(taxonomy_filters)
         accessions = []
         for item in genbank_query:
-            if item[0] != "NA":  # if GenBank accession not stored as 'NA'
-                source_organism = item[-1].genus + item[-1].species
-                if any(filter in source_organism for filter in taxonomy_filters):
-                    accessions.append(item[0])
+            if item.genbank_accession != "NA":  # if GenBank accession not stored as 'NA'
+                source_organism = item.genus + item.species
+                if taxonomy_pattern.search(source_organism):
+                    accessions.append(item.genbank_accession)
     return accessions
 
 
@@ -631,17 +554,18 @@ def extract_accessions_and_dates(genbank_query, taxonomy_filters):
 
     if taxonomy_filters is None:
         for item in genbank_query:
-            if item[0].genbank_accession == "NA":  # no GenBank accession stored in CAZy
+            if item.genbank_accession == "NA":  # no GenBank accession stored in CAZy
                 continue
-            accessions[item[0].genbank_accession] = item[0].seq_update_date
+            accessions[item.genbank_accession] = item.seq_update_date
 
     else:
+        taxonomy_pattern = compile_taxonomy_filter_re(taxonomy_filters)
         for item in genbank_query:
-            if item[0].genbank_accession == "NA":  # no GenBank accession stored in CAZy
+            if item.genbank_accession == "NA":  # no GenBank accession stored in CAZy
                 continue
-            source_organism = item[-1].genus + item[-1].species
-            if any(filter in source_organism for filter in taxonomy_filters):
-                accessions[item[0].genbank_accession] = item[0].seq_update_date
+            source_organism = item.genus + item.species
+            if taxonomy_pattern.search(source_organism):
+                accessions[item.genbank_accession] = item.seq_update_date
 
     return accessions
 
@@ -660,21 +584,53 @@ def get_accessions_for_new_sequences(accessions):
 
     Return nothing.
     """
-    logger = logging.getLogger(__name__)
-
     accessions_list = list(accessions.keys())
-    accessions_string = ",".join(accessions_list)
-    # perform batch query of Entrez
+
+    # query Entrez in batches, posting the full accession list in one request can
+    # exceed NCBI limits, epost doesn't like posting more than 200 at once
+    for batch in get_accession_chunks(list(accessions_list), 200):
+        epost_webenv, epost_query_key = epost_accessions(batch, retmode="text")
+
+        # retrieve summary docs to check the sequence 'UpdateDates' in NCBI
+        check_docsums_for_updated_seq(
+            epost_webenv, epost_query_key, accessions, accessions_list,
+        )
+
+    return accessions_list
+
+
+def epost_accessions(accessions, **epost_kwargs):
+    """Post a batch of GenBank accessions to Entrez, for retrieval by a later efetch.
+
+    Shared by every Entrez query path in this module, so the epost/history-session
+    boilerplate lives in one place.
+
+    :param accessions: list of GenBank accessions
+    :param epost_kwargs: keyword arguments passed through to Entrez.epost
+
+    Return the (web environment, query key) of the Entrez post.
+    """
     epost_result = Entrez.read(
         entrez_retry(
-            Entrez.epost, "Protein", id=accessions_string, retmode="text",
+            Entrez.epost, "Protein", id=",".join(accessions), **epost_kwargs,
         )
     )
-    # retrieve the web environment and query key from the Entrez post
-    epost_webenv = epost_result["WebEnv"]
-    epost_query_key = epost_result["QueryKey"]
+    return epost_result["WebEnv"], epost_result["QueryKey"]
+
+
+def check_docsums_for_updated_seq(epost_webenv, epost_query_key, accessions, accessions_list):
+    """Check one batch of NCBI summary docs for sequences updated since their last retrieval.
 
-    # retrieve summary docs to check the sequence 'UpdateDates' in NCBI
+    Accessions whose NCBI sequence has not changed since it was last retrieved are removed
+    from accessions_list, leaving only the accessions whose sequences need retrieving.
+
+    :param epost_webenv: str, Entrez web environment of the posted accessions
+    :param epost_query_key: str, Entrez query key of the posted accessions
+    :param accessions: dict, {GenBank accessions (str):sequence retrieval data (str)}
+    :param accessions_list: list of GenBank accessions, modified in place
+
+    Return nothing.
+    """
     with entrez_retry(
         Entrez.efetch,
         db="Protein",
@@ -683,72 +639,104 @@ def get_accessions_for_new_sequences(accessions):
         rettype="docsum",
         retmode="xml",
     ) as handle:
-        summary_docs = Entrez.read(handle)
+        # parse each summary doc as it is streamed from NCBI, instead of materialising
+        # the full batch of docs in memory before the loop starts
+        for doc in Entrez.parse(handle):
+            try:
+                temp_accession = doc["AccessionVersion"]  # accession of current working protein
+            except KeyError:
+                logger.warning(
+                    f"Retrieved protein with accession {temp_accession} but this accession is "
+                    "not in the local database.\n"
+                    "Not retrieving a sequence for this accession."
+                )
+                continue
+            previous_date = accessions.get(temp_accession)
+            if previous_date is not None:
+                # sequence retrieved previosuly, thus check if the NCBI seq has been updated since
+                if parse_date(doc["UpdateDate"]) <= parse_date(previous_date):
+                    # the sequence at NCBI has not been updated since the seq was retrieved
+                    # thus no need to retrieve it again
+                    accessions_list.remove(temp_accession)
 
-    for doc in summary_docs:
-        try:
-            temp_accession = doc["AccessionVersion"]  # accession of the current working protein
-        except KeyError:
-            logger.warning(
-                f"Retrieved protein with accession {temp_accession} but this accession is not in "
-                "the local database.\n"
-                "Not retrieving a sequence for this accession."
-            )
-            continue
-        previous_data = accessions[temp_accession]
-        if previous_data is not None:
-            # sequence retrieved previosuly, thus check if the NCBI seq has been updated since
-            previous_data = previous_data.split("/")  # Y=[0], M=[1], D=[]
-            update_date = doc["UpdateDate"]
-            update_date = update_date.split("/")  # Y=[0], M=[1], D=[]
-            if datetime.date(
-                previous_data[0], previous_data[1], previous_data[2],
-            ) < datetime.data(
-                update_date[0], update_date[1], update_date[2],
-            ) is False:
-                # the sequence at NCBI has not been updated since the seq was retrieved
-                # thus no need to retrieve it again
-                accessions_list.remove(temp_accession)
+    return
+
+
+def parse_date(date_string):
+    """Convert a 'YYYY/MM/DD' date string into a comparable (year, month, day) tuple.
+
+    :param date_string: str, date formatted as 'YYYY/MM/DD'
+
+    Return a tuple of three ints.
+    """
+    year, month, day = date_string.split("/")
+    return (int(year), int(month), int(day))
 
-    return accessions_list
 
+def get_accession_chunks(accessions, chunk_length):
+    """Separate the accessions into separate chunks.
 
-def get_accession_chunks(lst, chunk_length):
-    """Separate the long list into separate chunks.
+    Consumes the accessions lazily, so an iterator (e.g. a streamed query result) can be
+    chunked without first materialising the full list in memory.
 
-    :param lst: list to be separated into smaller lists (or chunks)
-    :param chunk_length: int, the length of the lists the longer list is to be split up into
+    :param accessions: list or iterator of items to be separated into smaller lists (or chunks)
+    :param chunk_length: int, the length of the lists the accessions are to be split up into
 
     Return a generator object containing lists.
     """
-    for i in range(0, len(lst), chunk_length):
-        yield lst[i:i + chunk_length]
+    accessions = iter(accessions)
+    while True:
+        chunk = list(islice(accessions, chunk_length))
+        if len(chunk) == 0:
+            return
+        yield chunk
 
 
 # The following functions are for retrieving sequences, adding to the db and writing fasta files
 
 
-def get_sequences_add_to_db(accessions, date_today, session, args):
-    """Retrieve protein sequences from Entrez and add to the local database.
+def get_sequences_for_accession_chunks(accession_chunks, date_today, session, args):
+    """Fetch each batch of accessions from NCBI concurrently and add the sequences to the db.
 
-    :param accessions: list, GenBank accessions
+    The Entrez round trips are network-latency bound, so the batches are dispatched through
+    a small thread pool. Worker threads only perform the network calls; parsing results into
+    the database always happens on the calling thread, keeping the db session single-threaded.
+
+    :param accession_chunks: generator of lists of GenBank accessions
     :param date_today: str, YYYY/MM/DD
     :param session: open SQL database session
     :param args: cmb-line args parser
 
     Return nothing.
     """
-    logger = logging.getLogger(__name__)
+    # NCBI permits no more than 3 requests per second, or 10 with an API key
+    max_workers = 3 if args.api_key is None else 10
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_to_batch = {
+            executor.submit(fetch_sequences_from_ncbi, batch, args): batch
+            for batch in accession_chunks
+        }
+        for future in as_completed(future_to_batch):
+            batch = future_to_batch[future]
+            records = future.result()
+            add_retrieved_sequences_to_db(records, batch, date_today, session, args)
+
+    return
+
+
+def fetch_sequences_from_ncbi(accessions, args):
+    """Retrieve the protein sequences for one batch of GenBank accessions from Entrez.
+
+    :param accessions: list, GenBank accessions
+    :param args: cmb-line args parser
+
+    Return a list of (title, sequence) tuples, one per record.
+    """
+    if len(accessions) == 0:  # everything was filtered out upstream, nothing to post
+        return []
+
     # perform batch query of Entrez
-    accessions_string = ",".join(accessions)
-    epost_result = Entrez.read(
-        entrez_retry(
-            Entrez.epost, "Protein", id=accessions_string,
-        )
-    )
-    # retrieve the web environment and query key from the Entrez post
-    epost_webenv = epost_result["WebEnv"]
-    epost_query_key = epost_result["QueryKey"]
+    epost_webenv, epost_query_key = epost_accessions(accessions)
 
     # retrieve the protein sequences
     with entrez_retry(
@@ -759,73 +747,136 @@ def get_sequences_add_to_db(accessions, date_today, session, args):
         rettype="fasta",
         retmode="text",
     ) as seq_handle:
-        for record in SeqIO.parse(seq_handle, "fasta"):
-            # retrieve the accession of the record
-            temp_accession = record.id  # accession of the current working protein record
-
-            if temp_accession.find("|") != -1:  # sometimes multiple items are listed
-                success = False   # will be true if finds protein accession
-                temp_accession = temp_accession.split("|")
-                for item in temp_accession:
-                    # check if a accession number
-                    try:
-                        re.match(
-                            (
-                                r"(\D{3}\d{5,7}\.\d+)|(\D\d(\D|\d){3}\d)|"
-                                r"(\D\d(\D|\d){3}\d\D(\D|\d){2}\d)"
-                            ),
-                            item,
-                        ).group()
-                        temp_accession = item
-                        success = True
-                        break
-                    except AttributeError:  # raised if not an accession
-                        continue
-
-            else:
-                success = True  # have protein accession number
-
-            if success is False:
-                logger.error(
-                    f"Could not retrieve accession from {record.id}, therefore, "
-                    "protein sequence not added to the database,\n"
-                    "because cannot retrieve the necessary CAZyme record"
-                )
-                continue
+        # drain the response into a spooled temporary file in large blocks, so parsing
+        # reads from a local buffer instead of making many small reads against the
+        # socket; batches larger than ~10MB spill to disk instead of being held in memory
+        with SpooledTemporaryFile(max_size=10000000, mode="w+") as response_buffer:
+            shutil.copyfileobj(seq_handle, response_buffer)
+            response_buffer.seek(0)
+            # SimpleFastaParser yields plain (title, sequence) string tuples, skipping
+            # the construction of a SeqRecord and Seq object per record
+            return list(SimpleFastaParser(response_buffer))
 
-            # check the retrieve protein accession is in the list of retrieved accession
-            if temp_accession not in accessions:
-                logger.warning(
-                    f"Retrieved the accession {temp_accession} from the record id={record.id}, "
-                    "but this accession is not in the database.\n"
-                    "Therefore, not adding this protein seqence to the local database"
-                )
-                continue
 
-            # retrieve the GenBank record from the local data base to add the seq to
-            genbank_record = session.query(Genbank).\
-                filter(Genbank.genbank_accession == temp_accession).first()
+def get_sequences_add_to_db(accessions, date_today, session, args):
+    """Retrieve protein sequences from Entrez and add to the local database.
+
+    :param accessions: list, GenBank accessions
+    :param date_today: str, YYYY/MM/DD
+    :param session: open SQL database session
+    :param args: cmb-line args parser
+
+    Return nothing.
+    """
+    if len(accessions) == 0:
+        # the update check already filtered out every accession, skip the Entrez query
+        return
+
+    records = fetch_sequences_from_ncbi(accessions, args)
+    add_retrieved_sequences_to_db(records, accessions, date_today, session, args)
+    return
 
-            retrieved_sequence = str(record.seq)  # convert to a string becuase SQL expects a string
-            genbank_record.sequence = retrieved_sequence
-            genbank_record.seq_update_date = date_today
-            session.commit()
 
-            if args.fasta is not None:
-                file_io.write_out_fasta(record, temp_accession, args)
+def add_retrieved_sequences_to_db(records, accessions, date_today, session, args):
+    """Add protein sequences retrieved from Entrez to the local database.
 
-            if args.blastdb is not None:
-                file_io.write_fasta_for_db(record, temp_accession, args)
+    :param records: list of (title, sequence) tuples retrieved from Entrez
+    :param accessions: list, the GenBank accessions the records were requested for
+    :param date_today: str, YYYY/MM/DD
+    :param session: open SQL database session
+    :param args: cmb-line args parser
 
-            # remove the accession from the list
-            accessions.remove(temp_accession)
+    Return nothing.
+    """
+    # map the GenBank accessions onto their records' primary keys in a single query,
+    # instead of retrieving each record from the local database individually
+    accession_pks = dict(
+        session.query(Genbank.genbank_accession, Genbank.genbank_id).
+        filter(Genbank.genbank_accession.in_(accessions)).
+        all()
+    )
+
+    seq_rows = []  # sequence updates to write to the db in a single batch
+    fasta_records = []  # records to append to the output FASTA file in a single write
+    blastdb_records = []  # records to append to the BLAST db FASTA file in a single write
+
+    # track the accessions still awaiting a sequence in a set, so the membership test and
+    # removal per retrieved record are O(1) instead of O(n) scans of the list
+    remaining_accessions = set(accessions)
+
+    for title, retrieved_sequence in records:
+        # retrieve the accession of the record
+        record_id = title.split(None, 1)[0]  # id of the current working protein record
+        temp_accession = record_id
+
+        if temp_accession.find("|") != -1:  # sometimes multiple items are listed
+            success = False   # will be true if finds protein accession
+            temp_accession = temp_accession.split("|")
+            for item in temp_accession:
+                # check if a accession number
+                if any(pattern.match(item) for pattern in GENBANK_ACCESSION_RES):
+                    temp_accession = item
+                    success = True
+                    break
+
+        else:
+            success = True  # have protein accession number
+
+        if success is False:
+            logger.error(
+                f"Could not retrieve accession from {record_id}, therefore, "
+                "protein sequence not added to the database,\n"
+                "because cannot retrieve the necessary CAZyme record"
+            )
+            continue
 
-    if len(accessions) != 0:
+        # check the retrieve protein accession is in the list of retrieved accession
+        if temp_accession not in remaining_accessions:
+            logger.warning(
+                f"Retrieved the accession {temp_accession} from the record id={record_id}, "
+                "but this accession is not in the database.\n"
+                "Therefore, not adding this protein seqence to the local database"
+            )
+            continue
+
+        # stage the sequence for the batched write to the local database
+        seq_rows.append({
+            "genbank_id": accession_pks[temp_accession],
+            "sequence": retrieved_sequence,
+            "seq_update_date": date_today,
+        })
+
+        if args.fasta is not None:
+            if args.fasta == 'separate':  # per-accession files, written one at a time
+                file_io.write_separate_fasta(title, retrieved_sequence, temp_accession, args)
+            else:  # buffer the record, the batch is appended to the FASTA file in one write
+                fasta_records.append((title, retrieved_sequence))
+
+        if args.blastdb is not None:
+            blastdb_records.append((title, retrieved_sequence))
+
+        # remove the accession from the set of accessions awaiting a sequence
+        remaining_accessions.discard(temp_accession)
+
+    if len(fasta_records) != 0:
+        file_io.write_out_fasta_records(fasta_records, args)
+
+    if len(blastdb_records) != 0:
+        file_io.write_fasta_for_db_records(blastdb_records, args)
+
+    if len(seq_rows) != 0:
+        # write all retrieved sequences in one executemany UPDATE and a single commit,
+        # instead of one UPDATE and commit per record
+        session.bulk_update_mappings(Genbank, seq_rows)
+        session.commit()
+
+    if len(remaining_accessions) != 0:
+        # log the missing accessions in a single call, not one format+dispatch per accession
         logger.warning(
-            "Protein sequences were not retrieved for the following CAZyme in the local database"
+            f"Protein sequences were not retrieved for {len(remaining_accessions)} CAZyme(s) "
+            "in the local database.\nGenBank accessions: "
+            f"{', '.join(sorted(remaining_accessions))}"
         )
-        for acc in accessions:
-            logger.warning(f"GenBank accession: {acc}")
 
     return
 
@@ -844,21 +895,32 @@ def entrez_retry(entrez_func, *func_args, **func_kwargs):
 
     Returns record.
     """
-    logger = logging.getLogger(__name__)
     record, retries, tries = None, 10, 0
 
     while record is None and tries < retries:
         try:
             record = entrez_func(*func_args, **func_kwargs)
 
-        except IOError:
+        except IOError as err:
             # log retry attempt
             if tries < retries:
+                # back off exponentially (1s, 2s, 4s, ...), capped at 30s, so transient
+                # failures are retried quickly and persistent outages are not hammered.
+                # When NCBI throttles the request (HTTP 429) honour any Retry-After it
+                # sent, and add jitter so concurrent workers do not retry in lockstep
+                retry_after = 0
+                if isinstance(err, HTTPError):
+                    try:
+                        retry_after = int(err.headers.get("Retry-After", 0))
+                    except (TypeError, ValueError):  # missing or HTTP-date formatted
+                        retry_after = 0
+                sleep_time = max(retry_after, min(30, 2 ** tries)) + random.random()
                 logger.warning(
-                    f"Network error encountered during try no.{tries}.\nRetrying in 10s",
+                    f"Network error encountered during try no.{tries}.\n"
+                    f"Retrying in {sleep_time:.1f}s",
                     exc_info=1,
                 )
-                time.sleep(10)
+                time.sleep(sleep_time)
             tries += 1
 
     if record is None:
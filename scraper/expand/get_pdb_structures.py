@@ -46,16 +46,16 @@
 import logging
 import os
 import sys
-import time
-
-import pandas as pd
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from pathlib import Path
 from typing import List, Optional
 
 from Bio.PDB import PDBList
-from tqdm import tqdm
+from sqlalchemy import func, or_
 
+from scraper.expand import build_class_fam_filters
 from scraper.sql.sql_orm import (
     Cazyme,
     CazyFamily,
@@ -68,10 +68,19 @@ from scraper.utilities import config_logger, file_io, parse_configuration
 from scraper.utilities.parsers import build_pdb_structures_parser
 
 
+# the name Bio.PDB's PDBList gives the downloaded file for each structure file format
+PDB_FILE_NAME_FORMATS = {
+    "pdb": "pdb{code}.ent",
+    "mmCif": "{code}.cif",
+    "xml": "{code}.xml",
+    "mmtf": "{code}.mmtf",
+    "bundle": "{code}-pdb-bundle.tar",
+}
+
+
 def main(argv: Optional[List[str]] = None, logger: Optional[logging.Logger] = None):
     """Set up programme and initate run."""
-    start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # used in terminating message
-    start_time = pd.to_datetime(start_time)
+    start_time = datetime.now()  # used in terminating message
 
     # parse cmd-line arguments
     if argv is None:
@@ -125,17 +134,14 @@ def main(argv: Optional[List[str]] = None, logger: Optional[logging.Logger] = No
             args,
         )
 
-    end_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # used in terminating message
-    end_time = pd.to_datetime(start_time)
-    end_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    end_time = pd.to_datetime(end_time)
+    end_time = datetime.now()  # used in terminating message
     total_time = end_time - start_time
 
     logger.info(
         "Finished dowloading protein structures from PDB."
         "Terminating program.\n"
-        f"Scrape initated at {start_time}\n"
-        f"Scrape finished at {end_time}\n"
+        f"Scrape initated at {start_time:%Y-%m-%d %H:%M:%S}\n"
+        f"Scrape finished at {end_time:%Y-%m-%d %H:%M:%S}\n"
         f"Total run time: {total_time}"
     )
 
@@ -143,8 +149,8 @@ def main(argv: Optional[List[str]] = None, logger: Optional[logging.Logger] = No
         "=====================cazy_webscraper-expand-pdb_structures=====================\n"
         "Finished dowloading protein structures from PDB."
         "Terminating program.\n"
-        f"Scrape initated at {start_time}\n"
-        f"Scrape finished at {end_time}\n"
+        f"Scrape initated at {start_time:%Y-%m-%d %H:%M:%S}\n"
+        f"Scrape finished at {end_time:%Y-%m-%d %H:%M:%S}\n"
         f"Total run time: {total_time}\n"
     )
 
@@ -160,34 +166,65 @@ def get_every_cazymes_structures(outdir, taxonomy_filters, kingdoms, session, ar
 
     Return nothing.
     """
-    # retrieve PDB accessions
-    pdb_query = session.query(Pdb, Cazyme, Taxonomy, Kingdom).\
-        join(Cazyme.pdbs).\
-        join(Cazyme, (Cazyme.taxonomy_id == Taxonomy.taxonomy_id)).\
+    # retrieve PDB accessions; only the accession column is needed downstream, so skip
+    # hydrating full ORM instances for every joined row
+    pdb_query = session.query(Pdb.pdb_accession).\
+        select_from(Kingdom).\
         join(Taxonomy, (Taxonomy.kingdom_id == Kingdom.kingdom_id)).\
-        all()
+        join(Cazyme, (Cazyme.taxonomy_id == Taxonomy.taxonomy_id)).\
+        join(Pdb, Cazyme.pdbs).\
+        distinct()
 
-    if taxonomy_filters is None:
-        for query_result in pdb_query:
-            pdb_accession = query_result[0].pdb_accession
-            pdb_accession = pdb_accession[:pdb_accession.find("[")]
-            download_pdb_structures(pdb_accession, outdir, args)
+    pdb_query = apply_taxonomy_filters(pdb_query, taxonomy_filters, kingdoms).all()
 
-    else:
-        for query_result in pdb_query:
-            source_organism = query_result[-2].genus + query_result[-2].species
-            if any(filter in source_organism for filter in taxonomy_filters):
-                pdb_accession = query_result[0].pdb_accession
-                pdb_accession = pdb_accession[:pdb_accession.find("[")]
-                download_pdb_structures(pdb_accession, outdir, args)
-            elif query_result[-1].kingdom in kingdoms:
-                pdb_accession = query_result[0].pdb_accession
-                pdb_accession = pdb_accession[:pdb_accession.find("[")]
-                download_pdb_structures(pdb_accession, outdir, args)
+    pdb_accessions = extract_pdb_accessions(pdb_query)
+    download_pdb_structures(pdb_accessions, outdir, args)
 
     return
 
 
+def apply_taxonomy_filters(pdb_query, taxonomy_filters, kingdoms):
+    """Apply the user's genus/species/strain and kingdom criteria to the query.
+
+    Filtering inside the database avoids materialising every joined row and re-scanning
+    them in Python. instr() is used instead of LIKE to keep the substring match case
+    sensitive, as the previous Python-side filtering was.
+
+    :param pdb_query: SQLAlchemy Query joining PDB accessions to taxonomies and kingdoms
+    :param taxonomy_filters: set of genera, species, and strains to retrieve structures for
+    :param kingdoms: set of taxonomy Kingdoms to retrieve structures for
+
+    Return the filtered Query.
+    """
+    if taxonomy_filters is None:
+        return pdb_query
+
+    tax_criteria = [
+        func.instr(Taxonomy.genus + Taxonomy.species, tax_filter) > 0
+        for tax_filter in taxonomy_filters
+    ]
+    if kingdoms is not None:
+        tax_criteria.append(Kingdom.kingdom.in_(kingdoms))
+
+    return pdb_query.filter(or_(*tax_criteria))
+
+
+def extract_pdb_accessions(pdb_query):
+    """Retrieve the PDB accessions from the query results.
+
+    :param pdb_query: sql collection of PDB accession rows
+
+    Return a list of unique PDB accessions, with the chain identifiers removed.
+    """
+    # different chains of the same structure share one accession once the chain
+    # identifier is stripped, so collect into a set to drop the duplicates
+    pdb_accessions = {
+        pdb_accession[:pdb_accession.find("[")] for (pdb_accession,) in pdb_query
+    }
+
+    return list(pdb_accessions)
+
+
 def get_structures_for_specific_cazymes(outdir, config_dict, taxonomy_filters, kingdoms, session, args):
     """Retrieve primary PDB accessions for CAZymes meeting criteria in the config_dict.
 
@@ -200,109 +237,82 @@ def get_structures_for_specific_cazymes(outdir, config_dict, taxonomy_filters, k
 
     Return nothing.
     """
-    # start with the classes
-    if len(config_dict["classes"]) != 0:
-        # create a dictionary to convert full class name to abbreviation
-        cazy_classes = config_dict["classes"]
-
-        for cazy_class in tqdm(cazy_classes, desc="Parsing CAZy classes"):
-            # retrieve class name abbreviation
-            cazy_class = cazy_class[((cazy_class.find("(")) + 1):((cazy_class.find(")")) - 1)]
-
-            # retrieve the CAZymes from the specified class
-            class_subquery = session.query(Cazyme.cazyme_id).\
-                join(CazyFamily, Cazyme.families).\
-                filter(CazyFamily.family.regexp(rf"{cazy_class}\d+")).\
-                subquery()
-
-            # Retrieve PDB accessions for the selected CAZymes
-            pdb_query = session.query(Pdb, Cazyme, Taxonomy, Kingdom).\
-                join(Cazyme.pdbs).\
-                join(Cazyme, (Cazyme.taxonomy_id == Taxonomy.taxonomy_id)).\
-                join(Taxonomy, (Taxonomy.kingdom_id == Kingdom.kingdom_id)).\
-                filter(Cazyme.cazyme_id.in_(class_subquery)).all()
-
-            if taxonomy_filters is None:
-                for query_result in pdb_query:
-                    pdb_accession = query_result[0].pdb_accession
-                    pdb_accession = pdb_accession[:pdb_accession.find("[")]
-                    download_pdb_structures(pdb_accession, outdir, args)
-
-            else:
-                for query_result in pdb_query:
-                    source_organism = query_result[-2].genus + query_result[-2].species
-                    if any(filter in source_organism for filter in taxonomy_filters):
-                        pdb_accession = query_result[0].pdb_accession
-                        pdb_accession = pdb_accession[:pdb_accession.find("[")]
-                        download_pdb_structures(pdb_accession, outdir, args)
-                    elif query_result[-1].kingdom in kingdoms:
-                        pdb_accession = query_result[0].pdb_accession
-                        pdb_accession = pdb_accession[:pdb_accession.find("[")]
-                        download_pdb_structures(pdb_accession, outdir, args)
-
-    # retrieve protein structure for specified families
-    for key in config_dict:
-        if key == "classes":
-            continue
-        if config_dict[key] is None:
-            continue
-
-        for family in tqdm(config_dict[key], desc=f"Parsing families in {key}"):
-            # Select the CAZymes under the specified (sub)family
-            if family.find("_") != -1:  # subfamily
-                # Retrieve GenBank accessions catalogued under the subfamily
-                family_subquery = session.query(Cazyme.cazyme_id).\
-                    join(CazyFamily, Cazyme.families).\
-                    filter(CazyFamily.subfamily == family).\
-                    subquery()
-
-            else:  # family
-                # Retrieve GenBank accessions catalogued under the family
-                family_subquery = session.query(Cazyme.cazyme_id).\
-                    join(CazyFamily, Cazyme.families).\
-                    filter(CazyFamily.family == family).\
-                    subquery()
-
-            # Retrieve PDB accessions of the selected CAZymes
-            pdb_query = session.query(Pdb, Cazyme, Taxonomy, Kingdom).\
-                join(Cazyme.pdbs).\
-                join(Cazyme, (Cazyme.taxonomy_id == Taxonomy.taxonomy_id)).\
-                join(Taxonomy, (Taxonomy.kingdom_id == Kingdom.kingdom_id)).\
-                filter(Cazyme.cazyme_id.in_(family_subquery)).all()
-
-            if taxonomy_filters is None:
-                for query_result in pdb_query:
-                    pdb_accession = query_result[0].pdb_accession
-                    pdb_accession = pdb_accession[:pdb_accession.find("[")]
-                    download_pdb_structures(pdb_accession, outdir, args)
-
-            else:
-                for query_result in pdb_query:
-                    source_organism = query_result[-2].genus + query_result[-2].species
-                    if any(filter in source_organism for filter in taxonomy_filters):
-                        pdb_accession = query_result[0].pdb_accession
-                        pdb_accession = pdb_accession[:pdb_accession.find("[")]
-                        download_pdb_structures(pdb_accession, outdir, args)
-                    elif query_result[-1].kingdom in kingdoms:
-                        pdb_accession = query_result[0].pdb_accession
-                        pdb_accession = pdb_accession[:pdb_accession.find("[")]
-                        download_pdb_structures(pdb_accession, outdir, args)
+    config_filters = build_class_fam_filters(config_dict)
+
+    if len(config_filters) == 0:
+        logger = logging.getLogger(__name__)
+        logger.warning(
+            "No CAZy classes or families specified in the configuration.\n"
+            "Not retrieving protein structures from PDB."
+        )
+        return
+
+    # get the CAZymes within the specified CAZy classes and (sub)families
+    cazyme_subquery = session.query(Cazyme.cazyme_id).\
+        join(CazyFamily, Cazyme.families).\
+        filter(or_(*config_filters)).\
+        subquery()
+
+    # Retrieve PDB accessions of the selected CAZymes; only the accession column is
+    # needed downstream, so skip hydrating full ORM instances for every joined row
+    pdb_query = session.query(Pdb.pdb_accession).\
+        select_from(Kingdom).\
+        join(Taxonomy, (Taxonomy.kingdom_id == Kingdom.kingdom_id)).\
+        join(Cazyme, (Cazyme.taxonomy_id == Taxonomy.taxonomy_id)).\
+        join(Pdb, Cazyme.pdbs).\
+        filter(Cazyme.cazyme_id.in_(cazyme_subquery)).\
+        distinct()
+
+    pdb_query = apply_taxonomy_filters(pdb_query, taxonomy_filters, kingdoms).all()
+
+    pdb_accessions = extract_pdb_accessions(pdb_query)
+    download_pdb_structures(pdb_accessions, outdir, args)
 
     return
 
 
-def download_pdb_structures(pdb_accession, outdir, args):
-    """Download protein structure from the RSCB PDB database
+def download_pdb_structures(pdb_accessions, outdir, args):
+    """Download protein structures from the RSCB PDB database
+
+    The downloads are network-latency bound, so they are dispatched through a small
+    thread pool, sharing a single PDBList instance across the workers.
 
-    :param pdb_accession: str, accession of record in the PDB database
+    :param pdb_accessions: list of str, accessions of records in the PDB database
     :param outdir: path to output directory
     :param args: cmd-line args parser
 
     Return nothing.
     """
+    if len(pdb_accessions) == 0:
+        return
+
+    # skip structures already present in the output directory, e.g. from a previous run
+    # that was interrupted part way through; the network is the bottleneck, so not
+    # re-requesting downloaded structures is the largest saving available on reruns.
+    # Only the file for the requested file format counts: a structure downloaded
+    # earlier in a different format is still retrieved
+    file_name_format = PDB_FILE_NAME_FORMATS[args.pdb]
+    outdir_path = Path(outdir)
+    pdb_accessions = [
+        pdb_accession for pdb_accession in pdb_accessions
+        if not (outdir_path / file_name_format.format(code=pdb_accession.lower())).exists()
+    ]
+    if len(pdb_accessions) == 0:
+        return
+
     pdbl = PDBList()
-    pdbl.retrieve_pdb_file(f"{pdb_accession}", file_format=args.pdb, pdir=args.outdir)
-    time.sleep(2)  # to prevent bombarding the system
+
+    # 4 concurrent downloads stays within what RCSB tolerates; more aggressive pools
+    # have been observed to trigger failed downloads
+    with ThreadPoolExecutor(max_workers=min(4, len(pdb_accessions))) as executor:
+        futures = [
+            executor.submit(
+                pdbl.retrieve_pdb_file, pdb_accession, file_format=args.pdb, pdir=outdir,
+            )
+            for pdb_accession in pdb_accessions
+        ]
+        for future in as_completed(futures):
+            future.result()
 
     return
 
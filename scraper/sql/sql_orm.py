@@ -38,6 +38,7 @@
 # SOFTWARE.
 """Submodule to build a local SQL database"""
 
+import functools
 import logging
 import os
 import re
@@ -70,7 +71,10 @@ from sqlalchemy.sql.operators import custom_op
 # Use the declarative system
 # Database structured in NF1
 Base = declarative_base()
-Session = sessionmaker()
+# the ingest commits once per record, and with the default expire_on_commit every
+# commit would expire the records still in hand (e.g. the Cazyme the scraper is
+# attaching accessions to) and re-SELECT them on the next attribute access
+Session = sessionmaker(expire_on_commit=False)
 
 
 # Enable regular expression searching of the database
@@ -103,14 +107,13 @@ def sqlite_regex_match(element, compiler, **kw):
     """Compile the SQL expression representing a regular expression match for the SQLite engine."""
     # determine the name of a custom SQLite function to use for the operator
     operator = element.operator.opstring
-    try:
-        func_name, _ = SQLITE_REGEX_FUNCTIONS[operator]
-    except (KeyError, ValueError) as e:
+    func_name = SQLITE_REGEX_FUNCTION_NAMES.get(operator)
+    if func_name is None:
         would_be_sql_string = ' '.join((compiler.process(element.left),
                                         operator,
                                         compiler.process(element.right)))
         raise exc.StatementError(
-            f"unknown regular expression match operator: {operator} {would_be_sql_string} {e}"
+            f"unknown regular expression match operator: {operator} {would_be_sql_string}"
         )
 
     # compile the expression as an invocation of the custom function
@@ -132,18 +135,47 @@ def sqlite_engine_connect(dbapi_connection, connection_record):
     for name, function in SQLITE_REGEX_FUNCTIONS.values():
         dbapi_connection.create_function(name, 2, function)
 
+    # tune SQLite for this workload on every connection (these PRAGMAs are
+    # per-connection, except journal_mode which persists in the database file):
+    # WAL lets readers run alongside the writer and avoids rewriting the journal,
+    # NORMAL sync is safe under WAL and skips a fsync per transaction, and the
+    # enlarged page cache keeps the repeatedly joined tables in memory
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA cache_size=-64000")  # 64 MB page cache
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")  # read pages via a 256 MB memory map
+    cursor.close()
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_regex_pattern(regex, flags=0):
+    """Compile (and cache) the regular expression used by a SQLite REGEXP operator.
+
+    SQLite calls the registered Python function once per scanned row, so the
+    pattern is compiled once here instead of being re-parsed for every row.
+    """
+    return re.compile(regex, flags)
+
 
 # Mapping from the regular expression matching operators
 # to named Python functions that implement them for SQLite.
 SQLITE_REGEX_FUNCTIONS = {
     '~': ('REGEXP',
-          lambda value, regex: bool(re.match(regex, value))),
+          lambda value, regex: bool(compile_regex_pattern(regex).match(value))),
     '~*': ('IREGEXP',
-           lambda value, regex: bool(re.match(regex, value, re.IGNORECASE))),
+           lambda value, regex: bool(compile_regex_pattern(regex, re.IGNORECASE).match(value))),
     '!~': ('NOT_REGEXP',
-           lambda value, regex: not re.match(regex, value)),
+           lambda value, regex: not compile_regex_pattern(regex).match(value)),
     '!~*': ('NOT_IREGEXP',
-            lambda value, regex: not re.match(regex, value, re.IGNORECASE)),
+            lambda value, regex: not compile_regex_pattern(regex, re.IGNORECASE).match(value)),
+}
+
+# operator -> SQLite function name, precomputed so compiling a regex match expression
+# is a single dict lookup instead of a tuple unpack guarded by try/except
+SQLITE_REGEX_FUNCTION_NAMES = {
+    operator: name for operator, (name, _) in SQLITE_REGEX_FUNCTIONS.items()
 }
 
 
@@ -157,6 +189,9 @@ cazymes_families = Table(
     Column("cazyme_id", Integer, ForeignKey("cazymes.cazyme_id")),
     Column("family_id", Integer, ForeignKey("families.family_id")),
     PrimaryKeyConstraint("cazyme_id", "family_id"),
+    # the composite primary key only serves cazyme_id-first lookups, so index the
+    # reverse direction (family -> cazymes) separately
+    Index("ix_cazymes_families_family_id", "family_id"),
 )
 
 
@@ -167,6 +202,7 @@ cazymes_ecs = Table(
     Column("cazyme_id", Integer, ForeignKey("cazymes.cazyme_id")),
     Column("ec_id", Integer, ForeignKey("ecs.ec_id")),
     PrimaryKeyConstraint("cazyme_id", "ec_id"),
+    Index("ix_cazymes_ecs_ec_id", "ec_id"),
 )
 
 
@@ -177,6 +213,7 @@ cazymes_uniprots = Table(
     Column("cazyme_id", Integer, ForeignKey("cazymes.cazyme_id")),
     Column("uniprot_id", Integer, ForeignKey("uniprots.uniprot_id")),
     PrimaryKeyConstraint("cazyme_id", "uniprot_id"),
+    Index("ix_cazymes_uniprots_uniprot_id", "uniprot_id"),
 )
 
 
@@ -187,6 +224,7 @@ cazymes_pdbs = Table(
     Column("cazyme_id", Integer, ForeignKey("cazymes.cazyme_id")),
     Column("pdb_id", Integer, ForeignKey("pdbs.pdb_id")),
     PrimaryKeyConstraint("cazyme_id", "pdb_id"),
+    Index("ix_cazymes_pdbs_pdb_id", "pdb_id"),
 )
 
 
@@ -380,6 +418,9 @@ class Cazymes_Genbanks(Base):
     __tablename__ = "cazymes_genbanks"
     __table_args__ = (
         UniqueConstraint("cazyme_id", "genbank_id", "primary"),
+        # covering index for the hot join/filter path: joins on cazyme_id, filtered on
+        # primary, and retrieving genbank_id, without touching the table rows
+        Index("ix_cg_cazyme_primary_genbank", "cazyme_id", "primary", "genbank_id"),
     )
 
     link_id = Column(Integer, primary_key=True)  # unique ID of the CAZyme-GenBank relationship
@@ -539,6 +580,26 @@ def build_db(time_stamp, args):
     return Session()
 
 
+# indexes covering the join and filter columns the expand queries hit. Databases built
+# by older releases predate some of the indexes declared on the models, and create_all
+# only builds missing tables, so the indexes are created explicitly when a session to an
+# existing database is opened
+QUERY_INDEX_STATEMENTS = (
+    "CREATE INDEX IF NOT EXISTS ix_genbanks_genbank_accession ON genbanks (genbank_accession)",
+    'CREATE INDEX IF NOT EXISTS ix_cg_cazyme_primary_genbank '
+    'ON cazymes_genbanks (cazyme_id, "primary", genbank_id)',
+    "CREATE INDEX IF NOT EXISTS ix_cazymes_genbanks_genbank_id ON cazymes_genbanks (genbank_id)",
+    "CREATE INDEX IF NOT EXISTS ix_cazymes_taxonomy_id ON cazymes (taxonomy_id)",
+    "CREATE INDEX IF NOT EXISTS ix_taxs_kingdom_id ON taxs (kingdom_id)",
+    "CREATE INDEX IF NOT EXISTS ix_families_family ON families (family)",
+    "CREATE INDEX IF NOT EXISTS ix_families_subfamily ON families (subfamily)",
+    "CREATE INDEX IF NOT EXISTS ix_cazymes_families_family_id ON cazymes_families (family_id)",
+    "CREATE INDEX IF NOT EXISTS ix_cazymes_ecs_ec_id ON cazymes_ecs (ec_id)",
+    "CREATE INDEX IF NOT EXISTS ix_cazymes_uniprots_uniprot_id ON cazymes_uniprots (uniprot_id)",
+    "CREATE INDEX IF NOT EXISTS ix_cazymes_pdbs_pdb_id ON cazymes_pdbs (pdb_id)",
+)
+
+
 def get_db_session(args):
     """Create open session to local CAZy SQL database.
 
@@ -553,6 +614,13 @@ def get_db_session(args):
 
     engine = create_engine(f"sqlite+pysqlite:///{db_path}", echo=False)
     Base.metadata.create_all(engine)
+
+    with engine.connect() as connection:
+        for statement in QUERY_INDEX_STATEMENTS:
+            connection.execute(statement)
+        # refresh the statistics the query planner uses to order joins
+        connection.execute("ANALYZE")
+
     Session.configure(bind=engine)
 
     return Session()
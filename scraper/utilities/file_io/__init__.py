@@ -43,11 +43,9 @@
 
 import logging
 import shutil
+import subprocess
 import sys
 
-from Bio import SeqIO
-from Bio.Blast.Applications import NcbimakeblastdbCommandline
-
 
 def make_output_directory(output, force, nodelete):
     """Create output directory for genomic files.
@@ -79,7 +77,7 @@ def make_output_directory(output, force, nodelete):
                     "Deleting content currently in output directory."
                 )
                 shutil.rmtree(output)
-                output.mkdir(exist_ok=force)
+                output.mkdir(parents=True, exist_ok=True)
                 return
 
         else:
@@ -90,7 +88,7 @@ def make_output_directory(output, force, nodelete):
             sys.exit(1)
 
     else:
-        output.mkdir(parents=True, exist_ok=force)
+        output.mkdir(parents=True, exist_ok=True)
         logger.warning(f"Built output directory: {output}")
 
     return
@@ -105,6 +103,10 @@ def write_out_fasta(record, genbank_accession, args):
 
     Return nothing.
     """
+    # imported here so tools that only use the directory/file helpers (e.g. the main
+    # scraper CLI) do not pay the Biopython import cost at startup
+    from Bio import SeqIO
+
     if args.fasta == 'separate':
         fasta_name = f"{genbank_accession}.fasta"
         fasta_name = args.write / fasta_name
@@ -119,6 +121,42 @@ def write_out_fasta(record, genbank_accession, args):
     return
 
 
+def write_separate_fasta(title, sequence, genbank_accession, args):
+    """Write one protein sequence, parsed as a (title, sequence) pair, to its own FASTA file.
+
+    :param title: str, FASTA title line of the record, without the leading '>'
+    :param sequence: str, protein sequence
+    :param genbank_accession: str, accession number of the protein sequence in NCBI.GenBank
+    :param args: cmd-line arguments parser
+
+    Return nothing.
+    """
+    fasta_name = f"{genbank_accession}.fasta"
+    fasta_name = args.write / fasta_name
+
+    with open(fasta_name, "w") as fh:
+        fh.write(f">{title}\n{sequence}\n")
+
+    return
+
+
+def write_out_fasta_records(records, args):
+    """Write out a batch of GenBank protein records to a single FASTA file.
+
+    The batch is written with one file open and one write, instead of re-opening the
+    FASTA file for every record.
+
+    :param records: list of (title, sequence) tuples, parsed by SimpleFastaParser
+    :param args: cmd-line arguments parser
+
+    Return nothing.
+    """
+    with open(args.fasta, "a") as fh:
+        fh.write("".join(f">{title}\n{sequence}\n" for title, sequence in records))
+
+    return
+
+
 def write_fasta_for_db(record, genbank_accession, args):
     """Write out protein sequences to FASTA file for building a BLAST db of all retrieved sequences.
 
@@ -128,6 +166,10 @@ def write_fasta_for_db(record, genbank_accession, args):
 
     Return nothing.
     """
+    # imported here so tools that only use the directory/file helpers (e.g. the main
+    # scraper CLI) do not pay the Biopython import cost at startup
+    from Bio import SeqIO
+
     fasta_name = args.blastdb
     fasta_name = fasta_name / "blast_db.fasta"
 
@@ -137,6 +179,26 @@ def write_fasta_for_db(record, genbank_accession, args):
     return
 
 
+def write_fasta_for_db_records(records, args):
+    """Write out a batch of protein records to the FASTA file for building a BLAST database.
+
+    The batch is written with one file open and one write, instead of re-opening the
+    FASTA file for every record.
+
+    :param records: list of (title, sequence) tuples, parsed by SimpleFastaParser
+    :param args: cmd-line arguments parser
+
+    Return nothing.
+    """
+    fasta_name = args.blastdb
+    fasta_name = fasta_name / "blast_db.fasta"
+
+    with open(fasta_name, "a") as fh:
+        fh.write("".join(f">{title}\n{sequence}\n" for title, sequence in records))
+
+    return
+
+
 def build_blast_db(args):
     """Build BLAST database of sequences retrieved from GenBank.
 
@@ -149,14 +211,25 @@ def build_blast_db(args):
     fasta_name = args.blastdb
     fasta_name = fasta_name / "blast_db.fasta"
 
-    # build the command
-    cmd_makedb = NcbimakeblastdbCommandline(cmd='makeblastdb', dbtype='prot', input_file=fasta_name)
-    # invoke the command
-    stdout, stderr = cmd_makedb()
-
-    # check the command was successfully exectured
-    if len(stderr) != 0:
-        logger.warning()
-        print(f"Could not build non-CAZyme db.\nstdout={stdout}\nstderr={stderr}")
+    # stream the FASTA file into makeblastdb over stdin, so the sequences flow straight
+    # into the database build instead of makeblastdb re-opening the intermediate file
+    cmd_makedb = [
+        "makeblastdb",
+        "-dbtype", "prot",
+        "-title", args.blastdb.name,
+        "-in", "-",
+        "-out", str(fasta_name),
+    ]
+    with open(fasta_name) as fh:
+        completed_process = subprocess.run(
+            cmd_makedb, stdin=fh, capture_output=True, text=True,
+        )
+
+    # check the command was successfully executed
+    if completed_process.returncode != 0:
+        logger.warning(
+            "Could not build non-CAZyme db.\n"
+            f"stdout={completed_process.stdout}\nstderr={completed_process.stderr}"
+        )
 
     return
@@ -294,6 +294,15 @@ def build_genbank_sequences_parser(argv: Optional[List] = None):
 
     # Add optional arguments to parser
 
+    # Add option to provide an NCBI API key, raising the request limit from 3 to 10 per second
+    parser.add_argument(
+        "-a",
+        "--api_key",
+        type=str,
+        default=None,
+        help="NCBI API key. Default: None, NCBI limits requests to 3 per second",
+    )
+
     # Add option for building a BLAST database of retrieved protein sequences
     parser.add_argument(
         "-b",
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# (c) University of St Andrews 2020-2021
+# (c) University of Strathclyde 2020-2021
+# (c) James Hutton Institute 2020-2021
+#
+# Author:
+# Emma E. M. Hobbs
+#
+# Contact
+# eemh1@st-andrews.ac.uk
+#
+# Emma E. M. Hobbs,
+# Biomolecular Sciences Building,
+# University of St Andrews,
+# North Haugh Campus,
+# St Andrews,
+# KY16 9ST
+# Scotland,
+# UK
+#
+# The MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""Tests the helpers shared by the expand modules.
+
+These test are intened to be run from the root of the repository using:
+pytest -v
+"""
+
+
+from sqlalchemy import or_
+
+from scraper import expand
+from scraper.sql.sql_orm import CazyFamily
+
+
+def test_class_abbreviation_extraction():
+    """Test the class abbreviation is extracted without the plural 's'."""
+    class_names = {
+        "Glycoside Hydrolases (GHs)": "GH",
+        "GlycosylTransferases (GTs)": "GT",
+        "Polysaccharide Lyases (PLs)": "PL",
+        "Carbohydrate Esterases (CEs)": "CE",
+        "Auxiliary Activities (AAs)": "AA",
+        "Carbohydrate-Binding Modules (CBMs)": "CBM",
+    }
+
+    for class_name, abbreviation in class_names.items():
+        match = expand.CLASS_ABBREV_RE.search(class_name)
+        assert match is not None
+        assert match.group(1) == abbreviation
+
+
+def test_class_filters_select_families(db_session):
+    """Test a class-only config selects the families of that class from the database."""
+    config_dict = {"classes": ["Polysaccharide Lyases (PLs)"]}
+
+    config_filters = expand.build_class_fam_filters(config_dict)
+
+    family_query = db_session.query(CazyFamily.family).\
+        filter(or_(*config_filters)).\
+        distinct().\
+        all()
+    families = [family for (family,) in family_query]
+
+    assert families == ["PL28"]
+
+
+def test_class_filters_no_matching_class(db_session):
+    """Test a class with no families in the database selects nothing."""
+    config_dict = {"classes": ["Glycoside Hydrolases (GHs)"]}
+
+    config_filters = expand.build_class_fam_filters(config_dict)
+
+    family_query = db_session.query(CazyFamily.family).\
+        filter(or_(*config_filters)).\
+        distinct().\
+        all()
+
+    assert family_query == []
+
+
+def test_family_and_subfamily_filters(db_session):
+    """Test named families and subfamilies are added to the filters."""
+    config_dict = {
+        "classes": [],
+        "Polysaccharide Lyases (PLs)": ["PL28", "GH3_1"],
+        "Glycoside Hydrolases (GHs)": None,
+    }
+
+    config_filters = expand.build_class_fam_filters(config_dict)
+
+    family_query = db_session.query(CazyFamily.family).\
+        filter(or_(*config_filters)).\
+        distinct().\
+        all()
+    families = [family for (family,) in family_query]
+
+    assert families == ["PL28"]